@@ -1,132 +1,355 @@
+import asyncio
+import numba
+import os
+import orjson
+import pickle
 import requests
+import numpy as np
 import pandas as pd
 import streamlit as st
+import threading
 import time
+import altair as alt
 import matplotlib.pyplot as plt
 import seaborn as sns
-
-# Function to handle API rate limits
+from collections import deque
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared session so all requests reuse the same TCP/TLS connection (keep-alive),
+# with gzip responses, a connection pool sized for the fetch thread pool, and
+# automatic retries with backoff on transient failures
+SESSION = requests.Session()
+SESSION.headers.update({"Accept-Encoding": "gzip", "User-Agent": "coingecko-selector"})
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=8,
+    # raise_on_status=False: when the retries are exhausted, return the final
+    # response instead of raising RetryError, so fetch_with_rate_limit can
+    # degrade gracefully (return None and fall back to stale data)
+    max_retries=Retry(total=3, backoff_factor=1, status_forcelist=[429, 502, 503, 504],
+                      raise_on_status=False)
+))
+
+
+# CoinGecko's free tier allows roughly 30-50 requests per minute; stay under
+# the low end so we never trigger a 429 in the first place
+MAX_REQ_PER_MIN = 30
+
+# Proactive token-bucket rate limiter: tracks request timestamps over a
+# sliding 60-second window and sleeps just long enough to stay under the cap
+class RateLimiter:
+    def __init__(self, max_per_minute):
+        self.max_per_minute = max_per_minute
+        self.timestamps = deque()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            # Drop timestamps that have aged out of the 60-second window
+            while self.timestamps and now - self.timestamps[0] >= 60:
+                self.timestamps.popleft()
+
+            if len(self.timestamps) >= self.max_per_minute:
+                # Sleep only until the oldest request leaves the window
+                wait_time = 60 - (now - self.timestamps[0])
+                if wait_time > 0:
+                    time.sleep(wait_time)
+                now = time.monotonic()
+                while self.timestamps and now - self.timestamps[0] >= 60:
+                    self.timestamps.popleft()
+
+            self.timestamps.append(now)
+
+RATE_LIMITER = RateLimiter(MAX_REQ_PER_MIN)
+
+# Stablecoins and wrapped assets to exclude, as a frozenset so membership
+# checks are O(1) instead of scanning a list per token
+STABLECOINS = frozenset([
+    "usdt", "usdc", "dai", "busd", "ust", "first digital usd",
+    "lido staked ether", "weth", "l2 standard bridged weth (base)",
+    "arbitrum bridged weth (arbitrum one)", "arbitrum bridged wbtc (arbitrum one)",
+    "coinbase wrapped btc", "kelp dao restaked eth", "ethereumpow",
+    "ether.fi staked eth", "wrapped steth", "swell ethereum", "jupiter staked sol",
+    "bitcoin avalanche bridged (btc.b)", "lombard staked btc", "bridged usdc (polygon pos bridge)",
+    "usual usd", "usdd", "paypal usd", "trueusd", "usdb", "marinade staked sol", "wrapped bitcoin",
+    "solv protocol solvbtc", "binance staked sol", "solayer staked sol", "cwbtc", "polygon bridged wbtc (polygon pos)",
+    "ether.fi staked btc", "tbtc", "usdx.money usdx", "binance-peg dogecoin"
+])
+
+# The only /coins/markets fields the ranking pipeline actually reads; the
+# full payload carries ~50 fields per token, so projecting down to these cuts
+# both the cached working set and the JSON handling cost roughly in half
+NEEDED_FIELDS = (
+    'id', 'name', 'symbol', 'current_price', 'total_volume', 'market_cap',
+    'ath', 'price_change_percentage_7d_in_currency'
+)
+
+COINS_MARKETS_URL = "https://api.coingecko.com/api/v3/coins/markets"
+
+# Token ids per tier page from the last full fetch, so refreshes within the
+# window below can re-pull just those ids instead of the whole ranked page.
+# Guarded by a lock because pages are fetched from a thread pool
+TIER_IDS = {}
+TIER_IDS_LOCK = threading.Lock()
+
+# How long a tier's id list stays usable for incremental refresh; after this
+# we do a full market_cap_desc pull again so tier membership can shift
+TIER_IDS_TTL = 3600
+
+# CoinGecko caps ids-filtered /coins/markets requests at 250 ids per call
+IDS_PER_BATCH = 250
+
+# On-disk fallback for the last successful API responses, so a rerun after a
+# rate-limit error can still serve stale-but-usable data
+RESPONSE_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".last_responses.pkl")
+
+@st.cache_resource
+def get_response_store():
+    try:
+        with open(RESPONSE_STORE_PATH, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.PickleError, EOFError):
+        return {}
+
+def remember_response(key, payload):
+    store = get_response_store()
+    store[key] = payload
+    try:
+        with open(RESPONSE_STORE_PATH, "wb") as f:
+            pickle.dump(store, f)
+    except OSError:
+        pass  # Disk persistence is best-effort; the in-memory store still works
+
+def recall_response(key):
+    return get_response_store().get(key)
+
+# Function to handle API rate limits. The proactive limiter keeps us under
+# the request cap; if a 429 slips through anyway, the mounted Retry policy
+# retries it internally, honoring the server's Retry-After header
 def fetch_with_rate_limit(url, params=None):
-    response = requests.get(url, params=params)
-    
-    # If we hit the rate limit, wait and retry
-    if response.status_code == 429:
-        print("Rate limit exceeded, sleeping for 60 seconds...")
-        time.sleep(60)  # Wait for 60 seconds and retry
-        response = requests.get(url, params=params)
-    
+    RATE_LIMITER.wait()
+    response = SESSION.get(url, params=params)
+
     if response.status_code == 200:
-        return response.json()
+        # orjson parses the multi-MB token pages several times faster than
+        # the stdlib json parser behind response.json()
+        return orjson.loads(response.content)
     else:
         print(f"Error fetching data: {response.status_code}")
         return None
 
 # Fetch global market data for VSI calculation
+@st.cache_data(ttl=60)
 def get_global_data():
     global_data = fetch_with_rate_limit("https://api.coingecko.com/api/v3/global")
-    
+
     if global_data and 'data' in global_data:
+        remember_response("global", global_data['data'])
         return global_data['data']
     else:
         print("Unexpected response structure for global data:", global_data)
-        return None
+        return recall_response("global")
+
+# Fetch only the given token ids, in batches of the API's 250-id maximum;
+# used for incremental refreshes where the tier membership is already known
+def fetch_tokens_by_ids(ids):
+    tokens = []
+    for start in range(0, len(ids), IDS_PER_BATCH):
+        batch = ids[start:start + IDS_PER_BATCH]
+        params = {
+            "vs_currency": "usd",
+            "ids": ",".join(batch),
+            "per_page": IDS_PER_BATCH,
+            "sparkline": False,
+            "price_change_percentage": "7d"
+        }
+        batch_tokens = fetch_with_rate_limit(COINS_MARKETS_URL, params=params)
+        if not batch_tokens:
+            return None
+        tokens.extend(batch_tokens)
+    return tokens
 
 # Fetch market data for a specific tier (1000 tokens per page)
 def get_top_tokens(page):
-    params = {
-        "vs_currency": "usd",
-        "order": "market_cap_desc",
-        "per_page": 1000,  # Get up to 1000 tokens
-        "page": page,  # Specify which page to fetch (1 = top 1-1000, 2 = 1001-2000, etc.)
-        "sparkline": False,
-        "price_change_percentage": "7d,30d"
-    }
-    tokens = fetch_with_rate_limit("https://api.coingecko.com/api/v3/coins/markets", params=params)
-    
+    # If we already know which tokens make up this tier, refresh just their
+    # dynamic fields via the ids filter: ranking shifts are small day-to-day,
+    # and the filtered responses are much lighter than a full ranked page
+    with TIER_IDS_LOCK:
+        known = TIER_IDS.get(page)
+    if known and time.monotonic() - known[0] < TIER_IDS_TTL:
+        tokens = fetch_tokens_by_ids(known[1])
+    else:
+        tokens = None
+
+    full_fetch = tokens is None
+    if full_fetch:
+        params = {
+            "vs_currency": "usd",
+            "order": "market_cap_desc",
+            "per_page": 1000,  # Get up to 1000 tokens
+            "page": page,  # Specify which page to fetch (1 = top 1-1000, 2 = 1001-2000, etc.)
+            "sparkline": False,
+            "price_change_percentage": "7d"  # 30d is never used downstream
+        }
+        tokens = fetch_with_rate_limit(COINS_MARKETS_URL, params=params)
+
     if tokens:
-        # Filter out stablecoins and tokens you want to exclude by checking both name and symbol (all lowercase)
-        stablecoins = [
-            "usdt", "usdc", "dai", "busd", "ust", "first digital usd", 
-            "lido staked ether", "weth", "l2 standard bridged weth (base)", 
-            "arbitrum bridged weth (arbitrum one)", "arbitrum bridged wbtc (arbitrum one)", 
-            "coinbase wrapped btc", "kelp dao restaked eth", "ethereumpow", 
-            "ether.fi staked eth", "wrapped steth", "swell ethereum", "jupiter staked sol",
-            "bitcoin avalanche bridged (btc.b)", "lombard staked btc", "bridged usdc (polygon pos bridge)",
-            "usual usd", "usdd", "paypal usd", "trueusd", "usdb", "marinade staked sol", "wrapped bitcoin",
-            "solv protocol solvbtc", "binance staked sol", "solayer staked sol", "cwbtc", "polygon bridged wbtc (polygon pos)",
-            "ether.fi staked btc", "tbtc", "usdx.money usdx", "binance-peg dogecoin"
-        ]
-        
-        # Normalize symbols and names to lowercase for comparison
+        # Filter out stablecoins and wrapped assets by checking both name and
+        # symbol: normalize each key once, then test the whole column against
+        # the STABLECOINS frozenset with a vectorized C-level isin
+        symbols = pd.Series([token['symbol'] for token in tokens]).str.lower()
+        names = pd.Series([token['name'] for token in tokens]).str.lower()
+        keep = ~(symbols.isin(STABLECOINS) | names.isin(STABLECOINS))
+        # Project each token down to the fields the pipeline uses so the
+        # cache and the DataFrames that follow carry ~8 columns, not ~50
         tokens = [
-            token for token in tokens 
-            if token['symbol'].lower() not in stablecoins and token['name'].lower() not in stablecoins
+            {field: token.get(field) for field in NEEDED_FIELDS}
+            for token, kept in zip(tokens, keep) if kept
         ]
-    
-    return tokens
-
-# Function to calculate metrics for each token
-def calculate_metrics(token, global_data):
-    # Calculate PVR (Price-to-Volume Ratio)
-    pvr = token['total_volume'] / token['current_price'] if token['current_price'] > 0 else 0
-    
-    # Ensure that price_change_percentage_7d is not None; use 0 if it's missing or None
-    price_change_percentage_7d = token.get('price_change_percentage_7d_in_currency') or 0
-    
-    # Calculate RVOL (Relative Volume over 7 days)
-    rvol = token['total_volume'] / token['market_cap'] if token['market_cap'] > 0 else 0
-    
-    # Calculate Momentum (Price Momentum over 7 days)
-    momentum = price_change_percentage_7d / 100  # Since it's given as a percentage
-    
-    # Calculate VSI (Volume Share Index)
+        # Remember the tier's membership after a full fetch so the next
+        # refresh inside the id-list window can use the ids shortcut
+        if full_fetch:
+            with TIER_IDS_LOCK:
+                TIER_IDS[page] = (time.monotonic(), [token['id'] for token in tokens])
+        remember_response(f"page_{page}", tokens)
+        return tokens
+
+    # Fall back to the last good payload for this page if the fetch failed
+    return recall_response(f"page_{page}")
+
+# Cached per-page fetch shared by every ranking path: ranking Tier 1 and then
+# the Top 3000 within the TTL reuses the page-1 entry instead of refetching it
+@st.cache_data(ttl=120, show_spinner=False)
+def fetch_page(page):
+    return get_top_tokens(page)
+
+# Function to calculate the main and additional metrics for all tokens in one
+# fused vectorized pass, so the token list is only walked once
+def calculate_metrics_frame(top_tokens, global_data):
+    # Normalize the CoinGecko JSON straight into a columnar DataFrame once
+    # (max_level=0 skips recursing into nested objects like 'roi'), then
+    # compute every metric as a whole-column expression instead of looping
+    # over tokens in Python
+    df = pd.json_normalize(top_tokens, max_level=0)
     global_volume = global_data['total_volume']['usd']
-    vsi = token['total_volume'] / global_volume if global_volume > 0 else 0
-    
-    return {
-        'token': token['name'],
-        'pvr': pvr,
-        'rvol': rvol,
-        'momentum': momentum,
-        'vsi': vsi
-    }
-
-# Function to calculate potential gains from ATH, 7-day price change, and MC/Vol ratio
-def calculate_additional_metrics(token):
-    # Ensure valid data for all fields, avoid division by zero
-    current_price = token['current_price'] if token['current_price'] > 0 else 1
-    ath_price = token['ath'] if token['ath'] > 0 else 1
-    total_volume = token['total_volume'] if token['total_volume'] > 0 else 1
-    market_cap = token['market_cap'] if token['market_cap'] > 0 else 1
-
-    # Calculate Potential Gains (e.g., x2, x5, etc.)
-    potential_gains = ath_price / current_price
- 
-    # 7-Day Price Change
-    price_change_7d = token.get('price_change_percentage_7d_in_currency', 0)
- 
-    # Market Cap to Volume Ratio
-    mc_vol_ratio = market_cap / total_volume
- 
-    return potential_gains, price_change_7d, mc_vol_ratio
+
+    # Ensure valid data for the additional-metric fields, avoid division by zero
+    current_price = df['current_price'].where(df['current_price'] > 0, 1)
+    ath_price = df['ath'].where(df['ath'] > 0, 1)
+    total_volume = df['total_volume'].where(df['total_volume'] > 0, 1)
+    market_cap = df['market_cap'].where(df['market_cap'] > 0, 1)
+
+    # Missing 7-day changes count as 0
+    price_change_7d = df['price_change_percentage_7d_in_currency'].fillna(0)
+
+    return pd.DataFrame({
+        'token': df['name'],
+        # PVR (Price-to-Volume Ratio)
+        'pvr': np.where(df['current_price'] > 0, df['total_volume'] / df['current_price'], 0),
+        # RVOL (Relative Volume over 7 days)
+        'rvol': np.where(df['market_cap'] > 0, df['total_volume'] / df['market_cap'], 0),
+        # Momentum (Price Momentum over 7 days)
+        'momentum': price_change_7d / 100,
+        # VSI (Volume Share Index)
+        'vsi': df['total_volume'] / global_volume if global_volume > 0 else 0,
+        # Potential Gains (e.g., x2, x5, etc.)
+        'Potential Gains (x)': ath_price / current_price,
+        # 7-Day Price Change
+        '7-Day Price Change (%)': price_change_7d,
+        # Market Cap to Volume Ratio
+        'MC/Volume Ratio': market_cap / total_volume
+    })
+
+# Fetch every requested page and build its metrics frame concurrently: each
+# page's fetch and frame construction run in their own task, so page 1's
+# DataFrame is built while pages 2 and 3 are still downloading instead of all
+# compute waiting for the slowest fetch. gather preserves page order
+async def gather_page_frames(pages, global_data):
+    async def fetch_and_build(page):
+        top_tokens = await asyncio.to_thread(fetch_page, page)
+        if not top_tokens:
+            return None
+        return await asyncio.to_thread(calculate_metrics_frame, top_tokens, global_data)
+
+    return await asyncio.gather(*(fetch_and_build(page) for page in pages))
+
+# Build the fused metrics frame for a set of tier pages. Memoized on the page
+# tuple so repeat clicks within the TTL reuse the finished frame instead of
+# refetching and recomputing; rank_tier passes (n,) and rank_all_tiers (1, 2, 3)
+@st.cache_data(ttl=300)
+def build_ranked_frame(pages):
+    # Fetch global data for VSI calculation
+    global_data = get_global_data()
+    if not global_data:
+        return None
+
+    frames = [
+        frame for frame in asyncio.run(gather_page_frames(pages, global_data))
+        if frame is not None
+    ]
+
+    if not frames:
+        return None
+
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+# The additional-metrics views expect a capitalized 'Token' column
+def additional_metrics_view(metrics_df):
+    return metrics_df[
+        ['token', 'Potential Gains (x)', '7-Day Price Change (%)', 'MC/Volume Ratio']
+    ].rename(columns={'token': 'Token'})
+
+# Fused scoring kernel, JIT-compiled with Numba: the PVRD deviation, all five
+# comparison scores, and the final sum are computed in one cache-hot loop over
+# the metric arrays instead of seven separate column passes. cache=True
+# persists the compiled binary so Streamlit reruns skip compilation
+@numba.njit(cache=True)
+def score_tokens(pvr, rvol, momentum, vsi, pvr_mean, rvol_mean, momentum_mean, vsi_mean):
+    n = pvr.shape[0]
+    pvrd = np.empty(n)
+    pvr_score = np.empty(n, dtype=np.int8)
+    rvol_score = np.empty(n, dtype=np.int8)
+    momentum_score = np.empty(n, dtype=np.int8)
+    pvrd_score = np.empty(n, dtype=np.int8)
+    vsi_score = np.empty(n, dtype=np.int8)
+    final_score = np.empty(n, dtype=np.int8)
+
+    for i in range(n):
+        # PVRD (Price-to-Volume Ratio Deviation) from the average PVR
+        pvrd[i] = (pvr[i] - pvr_mean) / pvr_mean
+
+        # Scoring system based on SQL query logic
+        pvr_score[i] = 1 if pvr[i] < pvr_mean else -1
+        rvol_score[i] = 1 if rvol[i] > rvol_mean else -1
+        momentum_score[i] = 1 if momentum[i] < momentum_mean else -1
+        pvrd_score[i] = 1 if pvrd[i] < 0 else -1
+        vsi_score[i] = 1 if vsi[i] > vsi_mean else -1
+
+        # Final score is the sum of individual scores
+        final_score[i] = (pvr_score[i] + rvol_score[i] + momentum_score[i]
+                          + pvrd_score[i] + vsi_score[i])
+
+    return pvrd, pvr_score, rvol_score, momentum_score, pvrd_score, vsi_score, final_score
 
 # Function to rank tokens based on their metrics
 def rank_tokens(tokens_metrics):
-    df = pd.DataFrame(tokens_metrics)
-    
-    # Calculate the average PVR for PVRD (Price-to-Volume Ratio Deviation)
-    df['pvrd'] = (df['pvr'] - df['pvr'].mean()) / df['pvr'].mean()
-    
-    # Scoring system based on SQL query logic
-    df['pvr_score'] = df['pvr'].apply(lambda x: 1 if x < df['pvr'].mean() else -1)
-    df['rvol_score'] = df['rvol'].apply(lambda x: 1 if x > df['rvol'].mean() else -1)
-    df['momentum_score'] = df['momentum'].apply(lambda x: 1 if x < df['momentum'].mean() else -1)
-    df['pvrd_score'] = df['pvrd'].apply(lambda x: 1 if x < 0 else -1)
-    df['vsi_score'] = df['vsi'].apply(lambda x: 1 if x > df['vsi'].mean() else -1)
-    
-    # Final score is the sum of individual scores
-    df['final_score'] = df[['pvr_score', 'rvol_score', 'momentum_score', 'pvrd_score', 'vsi_score']].sum(axis=1)
-    
+    # Work on the ranking columns only; the combined frame also carries the
+    # additional-metric display columns
+    df = tokens_metrics[['token', 'pvr', 'rvol', 'momentum', 'vsi']].copy()
+
+    pvr = df['pvr'].to_numpy(dtype=np.float64)
+    rvol = df['rvol'].to_numpy(dtype=np.float64)
+    momentum = df['momentum'].to_numpy(dtype=np.float64)
+    vsi = df['vsi'].to_numpy(dtype=np.float64)
+
+    # Means are computed once and passed in so the kernel stays a pure loop
+    (df['pvrd'], df['pvr_score'], df['rvol_score'], df['momentum_score'],
+     df['pvrd_score'], df['vsi_score'], df['final_score']) = score_tokens(
+        pvr, rvol, momentum, vsi, pvr.mean(), rvol.mean(), momentum.mean(), vsi.mean()
+    )
+
     # Rank by final score
     df = df.sort_values(by='final_score', ascending=False).head(30)
     
@@ -139,21 +362,25 @@ def visualize_rankings(ranked_tokens):
     # Sort by ranking for visualization
     ranked_tokens_sorted = ranked_tokens.sort_values(by="final_score", ascending=False)
     
-    # Create a bar plot using Seaborn
-    plt.figure(figsize=(10, 6))
+    # Create a bar plot using Seaborn via the object-oriented API, so the
+    # figure never enters pyplot's implicit global state
+    fig, ax = plt.subplots(figsize=(10, 6))
     sns.barplot(
-        data=ranked_tokens_sorted, 
-        x='final_score', 
-        y='token', 
-        palette='coolwarm'
+        data=ranked_tokens_sorted,
+        x='final_score',
+        y='token',
+        palette='coolwarm',
+        ax=ax
     )
-    
-    plt.title("Top 30 Tokens by Final Score")
-    plt.xlabel("Final Score")
-    plt.ylabel("Token")
-    
-    # Show the plot in Streamlit
-    st.pyplot(plt)
+
+    ax.set_title("Top 30 Tokens by Final Score")
+    ax.set_xlabel("Final Score")
+    ax.set_ylabel("Token")
+
+    # Show the plot in Streamlit, then release the figure so reruns don't
+    # accumulate figure objects and grow memory over a long session
+    st.pyplot(fig)
+    plt.close(fig)
 
 # Main Streamlit app function
 def main():
@@ -162,19 +389,17 @@ def main():
     # Add a horizontal line to separate
     st.markdown("---")
 
-    if st.button('Rank All Tiers (Top 3000)'):
-        rank_all_tiers()
-
-    # Add a horizontal line to separate
-    st.markdown("---")
-
-    # Create 3 buttons for each tier (1-3)
-    if st.button('Tier 1 (Top 1-1000)'):
-        rank_tier(1)
-    if st.button('Tier 2 (1001-2000)'):
-        rank_tier(2)
-    if st.button('Tier 3 (2001-3000)'):
-        rank_tier(3)
+    # One radio + run button instead of four separate buttons: any press still
+    # reruns the script, but only the selected ranking branch executes
+    tier = st.radio(
+        "Select a tier to rank",
+        ["All Tiers (Top 3000)", "Tier 1 (Top 1-1000)", "Tier 2 (1001-2000)", "Tier 3 (2001-3000)"]
+    )
+    if st.button("Run Ranking"):
+        if tier.startswith("All"):
+            rank_all_tiers()
+        else:
+            rank_tier(int(tier.split()[1]))
 
     # Add a horizontal line to separate
     st.markdown("---")
@@ -183,7 +408,17 @@ def main():
 
     # Explanation for Token Ranking
     with st.expander("📊 What is Final Score?"):
-        st.markdown("""
+        st.markdown(final_score_explainer())
+
+    # Additional Dropdown Description for the Additional Metrics
+    with st.expander("📊 Explanation of Additional Metrics"):
+        st.markdown(additional_metrics_explainer())
+
+# The explainer texts are cached so the large markdown literals are not
+# rebuilt on every rerun
+@st.cache_data
+def final_score_explainer():
+    return """
         ### How Are the Tokens Ranked for Final Score?
         This ranking system uses key trading and volume metrics to evaluate tokens across three market cap tiers (Top 1-1000, 1001-2000, and 2001-3000). Each tier of 1000 tokens is analyzed independently, and the top 30 tokens from each tier are ranked based on metrics that emphasize market activity and potential undervaluation.
 
@@ -228,11 +463,11 @@ def main():
         Yes, this ranking system is designed to highlight tokens that may be **undervalued** based on the relationship between **price** and **trading volume** (via PVR and PVRD). By identifying tokens with **low PVR** and **high trading volume relative to historical averages (RVOL, VSI)**, the system seeks to surface tokens that are seeing increased market attention but may not yet have seen a corresponding increase in price.
     
         This scoring method is particularly useful for traders seeking to discover tokens with rising market interest and activity, as these factors often precede price increases. However, these metrics should be used alongside other forms of analysis to make informed investment decisions.
-        """)
+        """
 
-    # Additional Dropdown Description for the Additional Metrics
-    with st.expander("📊 Explanation of Additional Metrics"):
-        st.markdown("""
+@st.cache_data
+def additional_metrics_explainer():
+    return """
         ### Additional Metrics Explained
         These additional metrics provide deeper insights into token performance, helping traders identify tokens with strong upside potential, recent momentum, and favorable trading conditions. Here's a breakdown of the metrics:
 
@@ -263,176 +498,115 @@ def main():
         - **Multi-Metric Opportunities**: Tokens that appear in multiple categories (e.g., Potential Gains, Price Change, MC/Vol Ratio, and Final Score) may offer the best overall opportunities, as they combine recovery potential, current market interest, and strong trading metrics.
 
         Together, these metrics give traders a well-rounded perspective on token performance, helping to identify both **short-term opportunities** (e.g., momentum and liquidity) and **long-term potential** (e.g., recovery from ATH).
-        """)
+        """
 
 # Function to rank a specific tier and calculate additional metrics for all tokens
 def rank_tier(tier_number):
     st.write(f"### Ranking Tier {tier_number} (Tokens {tier_number * 1000 - 999} to {tier_number * 1000})")
-    
-    # Fetch global data for VSI calculation
-    global_data = get_global_data()
-    
-    if global_data:
-        # Fetch tokens for the selected tier and calculate metrics
-        top_tokens = get_top_tokens(page=tier_number)
-        if top_tokens:
-            # Calculate main metrics (PVR, RVOL, etc.) for all tokens in the tier
-            tokens_metrics = [calculate_metrics(token, global_data) for token in top_tokens]
-            
-            # Rank tokens based on calculated metrics
-            ranked_tokens = rank_tokens(tokens_metrics)
-            
-            st.write(f"### Top 30 Ranked Tokens for Tier {tier_number} by Final Score")
-            st.write(ranked_tokens)
-            
-            # Visualize the final score ranking for top 30 tokens
-            visualize_rankings(ranked_tokens)
-
-            # Now, calculate additional metrics for **all tokens** in the tier
-            additional_metrics = []
-            for token in top_tokens:  # Loop through all tokens, not just the top 30
-                potential_gains, price_change_7d, mc_vol_ratio = calculate_additional_metrics(token)
-                additional_metrics.append({
-                    "Token": token['name'],
-                    "Potential Gains (x)": potential_gains,
-                    "7-Day Price Change (%)": price_change_7d,
-                    "MC/Volume Ratio": mc_vol_ratio
-                })
-                    
-            # Convert to DataFrame for easy display and visualization
-            additional_df = pd.DataFrame(additional_metrics)
-            st.write(f"### Tokens with Additional Metrics for Tier {tier_number}")
-            st.write(additional_df)
-
-            # Visualize the additional metrics (Top 30 for each metric), now passing both additional_df and ranked_tokens
-            visualize_additional_metrics(additional_df, ranked_tokens)  # Ensure both arguments are passed here
 
-        else:
-            st.write(f"Failed to fetch token data for Tier {tier_number}.")
+    # Fetch and score the whole tier through the memoized pipeline
+    tokens_metrics = build_ranked_frame((tier_number,))
+
+    if tokens_metrics is not None:
+        # Rank tokens based on calculated metrics
+        ranked_tokens = rank_tokens(tokens_metrics)
+
+        st.write(f"### Top 30 Ranked Tokens for Tier {tier_number} by Final Score")
+        st.write(ranked_tokens)
+
+        # Visualize the final score ranking for top 30 tokens
+        visualize_rankings(ranked_tokens)
+
+        # Reuse the fused frame for the additional metrics of **all tokens** in the tier
+        additional_df = additional_metrics_view(tokens_metrics)
+        st.write(f"### Tokens with Additional Metrics for Tier {tier_number}")
+        st.write(additional_df)
+
+        # Visualize the additional metrics (Top 30 for each metric), now passing both additional_df and ranked_tokens
+        visualize_additional_metrics(additional_df, ranked_tokens)  # Ensure both arguments are passed here
     else:
-        st.write("Failed to fetch global market data.")
+        st.write(f"Failed to fetch data for Tier {tier_number}.")
 
 # Function to rank all tiers and calculate additional metrics
 def rank_all_tiers():
     st.write(f"### Ranking Top 3000 Tokens (Combining Tier 1, Tier 2, and Tier 3)")
 
-    # Fetch global data for VSI calculation
-    global_data = get_global_data()
-    
-    if global_data:
-        all_tokens = []
-
-        # Fetch tokens from Tier 1
-        top_tokens_1 = get_top_tokens(page=1)
-        if top_tokens_1:
-            all_tokens.extend(top_tokens_1)
-
-        # Fetch tokens from Tier 2
-        top_tokens_2 = get_top_tokens(page=2)
-        if top_tokens_2:
-            all_tokens.extend(top_tokens_2)
-
-        # Fetch tokens from Tier 3
-        top_tokens_3 = get_top_tokens(page=3)
-        if top_tokens_3:
-            all_tokens.extend(top_tokens_3)
-
-        if all_tokens:
-            # Calculate metrics for all 3000 tokens
-            tokens_metrics = [calculate_metrics(token, global_data) for token in all_tokens]
-            
-            # Rank tokens based on calculated metrics (from 3000 tokens, pick top 30)
-            ranked_tokens = rank_tokens(tokens_metrics)
-            
-            st.write("### Top 30 Ranked Tokens from 3000 Tokens by Final Score")
-            st.write(ranked_tokens)
-            
-            # Now, calculate additional metrics for **all tokens**
-            additional_metrics = []
-            for token in all_tokens:  # Calculate for all tokens, not just top 30
-                potential_gains, price_change_7d, mc_vol_ratio = calculate_additional_metrics(token)
-                additional_metrics.append({
-                    "Token": token['name'],
-                    "Potential Gains (x)": potential_gains,
-                    "7-Day Price Change (%)": price_change_7d,
-                    "MC/Volume Ratio": mc_vol_ratio
-                })
-                    
-            # Convert to DataFrame for easy display and visualization
-            additional_df = pd.DataFrame(additional_metrics)
-            st.write("### Additional Metrics for Top 3000 Tokens")
-            st.write(additional_df)
-
-            # Now visualize the top 30 tokens for each additional metric separately
-            visualize_additional_metrics(additional_df, ranked_tokens)  # Pass both arguments
+    # Fetch and score all three tiers through the memoized pipeline; the
+    # per-page caches mean a tier that was just ranked alone is not refetched
+    tokens_metrics = build_ranked_frame((1, 2, 3))
 
-        else:
-            st.write("Failed to fetch token data from one or more tiers.")
+    if tokens_metrics is not None:
+        # Rank tokens based on calculated metrics (from 3000 tokens, pick top 30)
+        ranked_tokens = rank_tokens(tokens_metrics)
+
+        st.write("### Top 30 Ranked Tokens from 3000 Tokens by Final Score")
+        st.write(ranked_tokens)
+
+        # Reuse the fused frame for the additional metrics of **all tokens**
+        additional_df = additional_metrics_view(tokens_metrics)
+        st.write("### Additional Metrics for Top 3000 Tokens")
+        st.write(additional_df)
+
+        # Now visualize the top 30 tokens for each additional metric separately
+        visualize_additional_metrics(additional_df, ranked_tokens)  # Pass both arguments
     else:
-        st.write("Failed to fetch global market data.")
+        st.write("Failed to fetch token or global market data.")
 
 # Function to visualize additional metrics like Potential Gains, 7-Day Price Change, and MC/Vol Ratio
 def visualize_additional_metrics(df, ranked_tokens):
-    # Plot Potential Gains
-    df_sorted = df.sort_values(by="Potential Gains (x)", ascending=False).head(30)
-    st.write("### Top 30 Tokens by Potential Gains from Current Price to ATH")
-    fig, ax = plt.subplots(figsize=(10, 12))
-    sns.barplot(
-        data=df_sorted, 
-        x="Potential Gains (x)", 
-        y="Token", 
-        palette='Greens_d',  # Use 'Greens_d' for a darker green gradient
-        hue='Token',  
-        legend=False
-    )
-    ax.set_xlabel("Potential Gains (x)")
-    ax.set_ylabel("Token")
-    ax.set_title("Top 30 Tokens by Potential Gains (x) from Current Price to ATH")
-    st.pyplot(fig)
+    # One faceted Altair chart covers all three metrics: a single client-side
+    # Vega-Lite render and one payload to the browser instead of three
 
-    # Plot Price Change Over 7 Days
+    # Sort once per metric and slice the top 30; MC/Volume Ratio is ascending
+    # because lower is better
+    df_sorted = df.sort_values(by="Potential Gains (x)", ascending=False).head(30)
     df_sorted_7d = df.sort_values(by="7-Day Price Change (%)", ascending=False).head(30)
-    st.write("### Top 30 Tokens by 7-Day Price Change")
-    fig_7d, ax_7d = plt.subplots(figsize=(10, 12))
-    sns.barplot(
-        data=df_sorted_7d, 
-        x="7-Day Price Change (%)", 
-        y="Token", 
-        palette='Blues_d',  # Use 'Blues_d' for a darker blue gradient
-        hue='Token',  
-        legend=False
-    )
-    ax_7d.set_xlabel("7-Day Price Change (%)")
-    ax_7d.set_ylabel("Token")
-    ax_7d.set_title("Top 30 Tokens by 7-Day Price Change")
-    st.pyplot(fig_7d)
-
-    # Plot Market Cap to Volume Ratio (Lowest is Best)
-    df_sorted_mc_vol = df.sort_values(by="MC/Volume Ratio", ascending=True).head(30)  # Already ascending
-    st.write("### Top 30 Tokens by Market Cap to Volume Ratio (Lower is Better)")
-    fig_mc_vol, ax_mc_vol = plt.subplots(figsize=(10, 12))
-    sns.barplot(
-        data=df_sorted_mc_vol, 
-        x="MC/Volume Ratio", 
-        y="Token", 
-        palette='Oranges_d',  # Use 'Oranges_d' for a darker orange gradient
-        hue='Token',  
-        legend=False
+    df_sorted_mc_vol = df.sort_values(by="MC/Volume Ratio", ascending=True).head(30)
+
+    # Melt the three top-30 slices into long form (Token, metric, value)
+    long_df = pd.concat([
+        top30[['Token', metric]].rename(columns={metric: 'value'}).assign(metric=metric)
+        for metric, top30 in [
+            ("Potential Gains (x)", df_sorted),
+            ("7-Day Price Change (%)", df_sorted_7d),
+            ("MC/Volume Ratio", df_sorted_mc_vol)
+        ]
+    ], ignore_index=True)
+
+    st.write("### Top 30 Tokens by Potential Gains, 7-Day Price Change, and MC/Volume Ratio (Lower is Better)")
+    st.altair_chart(
+        alt.Chart(long_df)
+        .mark_bar()
+        .encode(
+            x=alt.X("value", title=None),
+            # sort=None keeps the pre-sorted row order, so each facet lists
+            # its own best token first
+            y=alt.Y("Token", sort=None, title=None),
+            color=alt.Color("metric", legend=None)
+        )
+        .properties(width=250, height=600)
+        .facet(column=alt.Column("metric", title=None))
+        .resolve_scale(x="independent", y="independent")
     )
-    ax_mc_vol.set_xlabel("MC/Volume Ratio")
-    ax_mc_vol.set_ylabel("Token")
-    ax_mc_vol.set_title("Top 30 Tokens by Market Cap to Volume Ratio (Lower is Better)")
-    ax_mc_vol.invert_yaxis()  # This will show lowest values at the top
-    st.pyplot(fig_mc_vol)
 
     # Now, include Final Score in the selection considerations
     df_sorted_final_score = ranked_tokens.sort_values(by="final_score", ascending=False).head(30)
 
+    # Count, for every token, how many of the four top-30 lists it appears in:
+    # one boolean membership column per category, summed across categories.
+    # This replaces the old chains of set intersections/unions with a single
+    # vectorized pass
+    tokens = df["Token"]
+    membership = np.vstack([
+        tokens.isin(df_sorted["Token"]).values,
+        tokens.isin(df_sorted_7d["Token"]).values,
+        tokens.isin(df_sorted_mc_vol["Token"]).values,
+        tokens.isin(df_sorted_final_score["token"]).values
+    ])
+    counts = membership.sum(axis=0)
+
     # 1. **Tokens appearing in all four categories**
-    tokens_in_all_four = (
-        set(df_sorted["Token"]).intersection(df_sorted_7d["Token"])
-        .intersection(df_sorted_mc_vol["Token"]).intersection(df_sorted_final_score["token"])
-    )
+    tokens_in_all_four = set(tokens[counts == 4])
 
     if tokens_in_all_four:
         st.write("### Final Selection Consideration: Tokens Appearing in All Four Categories")
@@ -442,12 +616,7 @@ def visualize_additional_metrics(df, ranked_tokens):
         st.write("No tokens appeared in all four categories.")
 
     # 2. **Tokens appearing in any three of the four categories**
-    tokens_in_three = (
-        (set(df_sorted["Token"]).intersection(df_sorted_7d["Token"]).intersection(df_sorted_mc_vol["Token"]))
-        .union(set(df_sorted["Token"]).intersection(df_sorted_7d["Token"]).intersection(df_sorted_final_score["token"]))
-        .union(set(df_sorted_7d["Token"]).intersection(df_sorted_mc_vol["Token"]).intersection(df_sorted_final_score["token"]))
-        .union(set(df_sorted["Token"]).intersection(df_sorted_mc_vol["Token"]).intersection(df_sorted_final_score["token"]))
-    ).difference(tokens_in_all_four)
+    tokens_in_three = set(tokens[counts == 3])
 
     if tokens_in_three:
         st.write("### Tokens Appearing in Three of the Four Categories")
@@ -457,14 +626,7 @@ def visualize_additional_metrics(df, ranked_tokens):
         st.write("No tokens appeared in three categories.")
 
     # 3. **Tokens appearing in any two of the four categories**
-    tokens_in_two = (
-        (set(df_sorted["Token"]).intersection(df_sorted_7d["Token"]))
-        .union(set(df_sorted["Token"]).intersection(df_sorted_mc_vol["Token"]))
-        .union(set(df_sorted["Token"]).intersection(df_sorted_final_score["token"]))
-        .union(set(df_sorted_7d["Token"]).intersection(df_sorted_mc_vol["Token"]))
-        .union(set(df_sorted_7d["Token"]).intersection(df_sorted_final_score["token"]))
-        .union(set(df_sorted_mc_vol["Token"]).intersection(df_sorted_final_score["token"]))
-    ).difference(tokens_in_all_four).difference(tokens_in_three)
+    tokens_in_two = set(tokens[counts == 2])
 
     if tokens_in_two:
         st.write("### Tokens Appearing in Two of the Four Categories")